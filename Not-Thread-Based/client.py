@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
 
 import asyncio
+import concurrent.futures
 import struct
+import threading
 import time
 import sys
+import checksum
 
 class State:
     HELLO_SEND = 0
@@ -13,8 +16,34 @@ class State:
     GOODBYE_SEND = 4
     CLOSED = 5
 
+class StdinReader:
+    # Reads stdin on a daemon thread so input() never blocks the event loop.
+    # The bounded queue gives backpressure: the thread stops reading until
+    # the client has taken the previous line.
+    def __init__(self, loop, maxsize=1):
+        self.loop = loop
+        self.lines = asyncio.Queue(maxsize)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        
+        self.thread.start()
+
+    def run(self):
+        
+        try:
+            for line in sys.stdin:
+                self.put(line)
+            self.put(None)  # EOF
+        except (RuntimeError, concurrent.futures.CancelledError):
+            pass  # Event loop already shut down
+
+    def put(self, line):
+        
+        asyncio.run_coroutine_threadsafe(self.lines.put(line), self.loop).result()
+
 class UAPClientProtocol(asyncio.DatagramProtocol):
-    def __init__(self, loop, server_address, port):
+    def __init__(self, loop, server_address, port, lines):
         self.loop = loop
         self.server_address = (server_address, port)
         self.magic_number = 0xC461
@@ -25,7 +54,13 @@ class UAPClientProtocol(asyncio.DatagramProtocol):
         self.state = State.HELLO_SEND
         self.retries = 0
         self.max_retries = 1  # No retries, just wait for the first ALIVE response
+        self.timeout = 5
         self.is_file_input = not sys.stdin.isatty()
+        self.checksum = checksum.NONE
+        self.lines = lines
+        self.timer = None
+        self.pending_line = None
+        self.closed = loop.create_future()
 
     def generate_session_id(self):
         
@@ -36,14 +71,32 @@ class UAPClientProtocol(asyncio.DatagramProtocol):
         self.transport = transport
         self.start_session()
 
+    def connection_lost(self, exc):
+        
+        if not self.closed.done():
+            self.closed.set_result(None)
+
     def start_session(self):
         
         self.send_message(command=0)  # HELLO command
         self.state = State.HELLO_WAIT
-        self.loop.call_later(5, self.hello_timeout)
+        self.start_timer(self.hello_timeout)
+
+    def start_timer(self, callback):
+        
+        self.cancel_timer()
+        self.timer = self.loop.call_later(self.timeout, callback)
+
+    def cancel_timer(self):
+        
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
 
     def send_message(self, command, payload=b''):
         
+        if command == 0:  # HELLO offers the checksum algorithms we support
+            payload = bytes([checksum.supported_mask()])
         header = struct.pack(
             '!HBBIIQI',
             self.magic_number,
@@ -55,6 +108,8 @@ class UAPClientProtocol(asyncio.DatagramProtocol):
             len(payload)
         )
         message = header + payload
+        if command != 0:
+            message = checksum.seal(message, self.checksum)
         self.transport.sendto(message, self.server_address)
         
         # Update sequence number and logical clock
@@ -69,8 +124,11 @@ class UAPClientProtocol(asyncio.DatagramProtocol):
 
     def handle_server_response(self, data):
         
-        header = data[:24]
-        payload = data[24:]
+        if len(data) < checksum.HEADER_SIZE:
+            print("Invalid packet received")
+            return
+
+        header = data[:checksum.HEADER_SIZE]
         
         (magic, version, command, sequence_number, session_id, logical_clock, payload_len) = struct.unpack(
             '!HBBIIQI', header
@@ -80,12 +138,18 @@ class UAPClientProtocol(asyncio.DatagramProtocol):
             print("Invalid packet received")
             return
 
+        try:
+            payload = checksum.unseal(data, payload_len, self.checksum if command != 0 else checksum.NONE)
+        except ValueError as e:
+            print(f"Invalid packet received: {e}")
+            return
+
         # Update logical clock
         self.logical_clock = max(self.logical_clock, logical_clock) + 1
         print(f"Updated logical clock: {self.logical_clock}")
 
         if command == 0:  # HELLO response
-            self.handle_hello_response()
+            self.handle_hello_response(payload)
 
         elif command == 2:  # ALIVE response
             self.handle_alive_response()
@@ -93,63 +157,66 @@ class UAPClientProtocol(asyncio.DatagramProtocol):
         elif command == 3:  # GOODBYE
             self.handle_goodbye_response()
 
-    def handle_hello_response(self):
+    def handle_hello_response(self, payload):
         
         if self.state == State.HELLO_WAIT:
             print("Received HELLO response, session established")
+            if payload and payload[0] in checksum.ALGORITHMS:
+                self.checksum = payload[0]
+            print(f"Checksum: {checksum.NAMES[self.checksum]}")
+            self.cancel_timer()
             self.state = State.DATA_SEND
-            asyncio.create_task(self.send_data())
+            self.request_line()
 
     def handle_alive_response(self):
         
         if self.state == State.ALIVE_WAIT:
             print("Server is alive, received ALIVE response")
+            self.cancel_timer()
             self.state = State.DATA_SEND
             self.retries = 0  # Reset retries
+            self.request_line()
 
     def handle_goodbye_response(self):
         
         print("Server sent GOODBYE, closing session")
-        self.state = State.CLOSED
-        self.transport.close()
-        self.loop.call_soon(self.loop.stop)  # Stop the loop after handling GOODBYE
+        self.close()
 
-    async def send_data(self):
+    def request_line(self):
         
-        if self.is_file_input:
-            for line in sys.stdin:
-                if self.state == State.CLOSED:
-                    break
-                self.send_message(1, line.encode())  # Send DATA message
-                self.state = State.ALIVE_WAIT
-                await self.wait_for_alive_response()
-        else:
-            await self.send_data_interactive()
+        if not self.is_file_input:
+            print("Enter data to send (or 'q' to quit): ", end='', flush=True)
+        self.pending_line = self.loop.create_task(self.lines.get())
+        self.pending_line.add_done_callback(self.line_received)
 
-
-    async def send_data_interactive(self):
+    def line_received(self, task):
         
-        while self.state != State.CLOSED:
-            user_input = input("Enter data to send (or 'q' to quit): ")
-            if user_input.lower() == 'q':
+        self.pending_line = None
+        if task.cancelled() or self.state != State.DATA_SEND:
+            return
+
+        line = task.result()
+        if line is None:
+            print("EOF detected on stdin, sending GOODBYE and closing session")
+            self.send_goodbye()
+            return
+
+        if not self.is_file_input:
+            line = line.rstrip('\n')
+            if line.lower() == 'q':
                 print("Received 'q', sending GOODBYE and closing session")
-                self.state = State.GOODBYE_SEND
-                self.send_message(3)  # Send GOODBYE command
-                break
-            else:
-                self.send_message(1, user_input.encode())  # Send DATA message
-                self.state = State.ALIVE_WAIT
-                await self.wait_for_alive_response()
+                self.send_goodbye()
+                return
 
-    async def wait_for_alive_response(self):
+        self.send_message(1, line.encode())  # Send DATA message
+        self.state = State.ALIVE_WAIT
+        self.start_timer(self.alive_timeout)
+
+    def send_goodbye(self):
         
-        await asyncio.sleep(5)  # Wait for 5 seconds for the ALIVE response
-        if self.state == State.ALIVE_WAIT:
-            print("ALIVE response timeout, sending GOODBYE and closing session.")
-            self.send_message(3)  # Send GOODBYE message
-            self.state = State.CLOSED
-            self.transport.close()  # Close the transport
-            self.loop.call_soon(self.loop.stop)  # Stop the loop
+        self.state = State.GOODBYE_SEND
+        self.send_message(3)  # Send GOODBYE command
+        self.start_timer(self.goodbye_timeout)
 
     def hello_timeout(self):
         
@@ -158,48 +225,66 @@ class UAPClientProtocol(asyncio.DatagramProtocol):
             if self.retries > self.max_retries:
                 print("HELLO response timeout, sending GOODBYE and terminating.")
                 self.send_message(3)  # GOODBYE command
-                self.state = State.CLOSED
+                self.close()
             else:
                 print("HELLO response timeout, resending HELLO.")
                 self.send_message(0)  # Resend HELLO
+                self.start_timer(self.hello_timeout)
+
+    def alive_timeout(self):
+        
+        if self.state == State.ALIVE_WAIT:
+            print("ALIVE response timeout, sending GOODBYE and closing session.")
+            self.send_message(3)  # Send GOODBYE message
+            self.close()
+
+    def goodbye_timeout(self):
+        
+        if self.state == State.GOODBYE_SEND:
+            print("GOODBYE response timeout, closing session.")
+            self.close()
+
+    def close(self):
+        
+        if self.state == State.CLOSED:
+            return
+        self.state = State.CLOSED
+        self.cancel_timer()
+        if self.pending_line is not None:
+            self.pending_line.cancel()
+        self.transport.close()
 
 async def main(server_ip, server_port):
     
-    loop = asyncio.get_event_loop()
+    loop = asyncio.get_running_loop()
+    reader = StdinReader(loop)
+    transport = None
     try:
         # Create a datagram endpoint (UDP client) depending on the IP version
         if ':' in server_ip:  # IPv6 address
             connect = loop.create_datagram_endpoint(
-                lambda: UAPClientProtocol(loop, server_ip, server_port),
+                lambda: UAPClientProtocol(loop, server_ip, server_port, reader.lines),
                 remote_addr=(server_ip, server_port, 0, 0)
             )
         else:  # IPv4 address
             connect = loop.create_datagram_endpoint(
-                lambda: UAPClientProtocol(loop, server_ip, server_port),
+                lambda: UAPClientProtocol(loop, server_ip, server_port, reader.lines),
                 remote_addr=(server_ip, server_port)
             )
         
         transport, protocol = await connect
-        
-        # Track the main task to allow for cancellation
-        sleep_task = loop.create_task(asyncio.sleep(3600))  # Long-running task to keep the client active
+        reader.start()
 
-        # Wait for either the sleep to complete or the protocol to close the session
-        await sleep_task
+        # The protocol resolves this future once the session is closed
+        await protocol.closed
 
     except Exception as e:
         print(f"Error occurred: {e}")
 
     finally:
-        # Ensure that all tasks are cancelled before stopping the loop
-        tasks = [t for t in asyncio.all_tasks() if not t.done()]
-        for task in tasks:
-            task.cancel()
-            try:
-                await task
-            except asyncio.CancelledError:
-                pass
-        loop.stop()  # Ensure loop is stopped when done
+        if transport is not None:
+            transport.close()
+        print("Client session closed.")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+from collections import deque
+
+class DeficitRoundRobin:
+    # Per-session reply queues served in deficit round-robin order, so one
+    # session with a long backlog cannot starve replies to the others.
+    # Queued bytes are bounded by max_bytes; past that the oldest reply of
+    # the longest queue is dropped.
+    def __init__(self, quantum=256, max_bytes=64 * 1024):
+        self.quantum = quantum
+        self.max_bytes = max_bytes
+        self.queues = {}
+        self.backlog = {}
+        self.deficits = {}
+        self.active = deque()  # Sessions with queued replies, head is being served
+        self.size = 0
+
+    def push(self, key, packet, addr):
+        while self.queues and self.size + len(packet) > self.max_bytes:
+            self.drop_longest()
+
+        if key not in self.queues:
+            self.queues[key] = deque()
+            self.backlog[key] = 0
+            self.deficits[key] = 0 if self.active else self.quantum
+            self.active.append(key)
+        self.queues[key].append((packet, addr))
+        self.backlog[key] += len(packet)
+        self.size += len(packet)
+
+    def pop(self):
+        while self.active:
+            key = self.active[0]
+            packet, addr = self.queues[key][0]
+            if len(packet) <= self.deficits[key]:
+                self.deficits[key] -= len(packet)
+                self.remove_head(key)
+                return packet, addr
+            # Turn over, the next session gets its quantum
+            self.active.rotate(-1)
+            self.deficits[self.active[0]] += self.quantum
+        return None
+
+    def remove_head(self, key):
+        packet, _ = self.queues[key].popleft()
+        self.backlog[key] -= len(packet)
+        self.size -= len(packet)
+        if not self.queues[key]:
+            was_serving = self.active[0] == key
+            self.active.remove(key)
+            del self.queues[key], self.backlog[key], self.deficits[key]
+            if was_serving and self.active:
+                self.deficits[self.active[0]] += self.quantum
+
+    def drop_longest(self):
+        key = max(self.backlog, key=self.backlog.get)
+        self.remove_head(key)
+        print(f"Egress full: dropped reply for session {key}")
+
+class EgressScheduler:
+    # Replies are queued per session and written to the transport only while
+    # its write buffer is below the high-water mark. The protocol forwards
+    # pause_writing()/resume_writing() here, so a congested socket backs up
+    # into the bounded queues instead of the transport's unbounded buffer.
+    def __init__(self, transport, quantum=256, max_bytes=64 * 1024, high=16 * 1024, low=4 * 1024):
+        self.transport = transport
+        self.queues = DeficitRoundRobin(quantum, max_bytes)
+        self.paused = False
+        transport.set_write_buffer_limits(high=high, low=low)
+
+    def send(self, key, packet, addr):
+        self.queues.push(key, packet, addr)
+        self.drain()
+
+    def drain(self):
+        while not self.paused and not self.transport.is_closing():
+            item = self.queues.pop()
+            if item is None:
+                return
+            self.transport.sendto(*item)
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.drain()
@@ -3,6 +3,8 @@
 import asyncio
 import struct
 import sys
+import checksum
+import egress
 
 class UAPAsyncUDPServer(asyncio.DatagramProtocol):
     FORMAT = '!HBBIIQI'
@@ -18,17 +20,30 @@ class UAPAsyncUDPServer(asyncio.DatagramProtocol):
 
     def connection_made(self, transport):
         self.transport = transport
+        self.egress = egress.EgressScheduler(transport)
         print(f"UDP server is up and listening on port {self.port}...")
 
+    def pause_writing(self):
+        self.egress.pause_writing()
+
+    def resume_writing(self):
+        self.egress.resume_writing()
+
     def datagram_received(self, data, addr):
+        header = None
         try:
-            header = struct.unpack(self.FORMAT, data[:24])
+            header = struct.unpack(self.FORMAT, data[:checksum.HEADER_SIZE])
             if header[0] != self.magic_num or header[1] != self.version:
                 raise ValueError(f"Protocol error: Magic Number or version mismatch. Got {header[0]} and {header[1]}")
 
             command = header[2]
             session_id = header[4]
 
+            # HELLO is never checksummed since it carries the negotiation itself
+            session = self.sessionData.get(session_id)
+            algorithm = session["checksum"] if session and command != self.HELLO else checksum.NONE
+            payload = checksum.unseal(data, header[6], algorithm)
+
             print(f"Received command {command} with session ID {session_id}")
             print(f"Current Session Data: {self.sessionData}")
 
@@ -37,13 +52,18 @@ class UAPAsyncUDPServer(asyncio.DatagramProtocol):
                 if session_id in self.sessionData:
                     raise ValueError(f"Protocol Error: Session already initiated for session ID {session_id}")
                 else:
+                    # A client that offers checksums sends a bitmask of supported algorithms
+                    algorithm = checksum.choose(payload[0]) if payload else checksum.NONE
                     self.sessionData[session_id] = {
                         "seq": header[3],
                         "addr": addr,
                         "log_clk": header[5],
-                        "state": self.HELLO
+                        "state": self.HELLO,
+                        "checksum": algorithm
                     }
-                    self.send_data(self.HELLO, session_id, addr)  # send HELLO response to client
+                    print(f"Checksum for session {session_id}: {checksum.NAMES[algorithm]}")
+                    # send HELLO response to client, with the chosen algorithm if checksums were offered
+                    self.send_data(self.HELLO, session_id, addr, bytes([algorithm]) if payload else b'')
 
             elif command == self.DATA:  # DATA from client
                 print(f"DATA from {addr} received")
@@ -56,7 +76,7 @@ class UAPAsyncUDPServer(asyncio.DatagramProtocol):
                     else:
                         self.sessionData[session_id]['seq'] = header[3]
 
-                    self.received_message = data[24:].decode() if header[6] != 0 else ""
+                    self.received_message = payload.decode()
                     print(f"Data received from client addr {addr}: {self.received_message}")
                     
                     # Send ALIVE message after receiving DATA
@@ -90,11 +110,14 @@ class UAPAsyncUDPServer(asyncio.DatagramProtocol):
             print(f"Header: {header}")
             print(f"Session Data: {self.sessionData}")
 
-    def send_data(self, command, session_id, addr):
+    def send_data(self, command, session_id, addr, payload=b''):
         if session_id in self.sessionData:
             seq_num = self.sessionData[session_id]['seq']
-            header = struct.pack(self.FORMAT, self.magic_num, self.version, command, seq_num, session_id, 0, 0)
-            self.transport.sendto(header, addr)
+            header = struct.pack(self.FORMAT, self.magic_num, self.version, command, seq_num, session_id, 0, len(payload))
+            message = header + payload
+            if command != self.HELLO:
+                message = checksum.seal(message, self.sessionData[session_id]['checksum'])
+            self.egress.send(session_id, message, addr)
         else:
             print(f"Warning: Attempt to send data for non-existent session ID {session_id}")
 
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import struct
+import sys
+import timeit
+import zlib
+
+# Checksum algorithm identifiers, negotiated in the HELLO payload.
+# The client offers a bitmask of the ids it supports and the server answers
+# with the single id it picked; NONE keeps the plain 24-byte header protocol.
+NONE, CRC32, CRC32C = 0, 1, 2
+NAMES = {NONE: "none", CRC32: "crc32", CRC32C: "crc32c"}
+
+HEADER_SIZE = 24
+TRAILER = struct.Struct('!I')  # Checksum over header + payload, appended after the payload
+
+def _crc32(data):
+    return zlib.crc32(data) & 0xFFFFFFFF
+
+ALGORITHMS = {CRC32: _crc32}
+
+# CRC32C uses the SSE4.2 / ARMv8 CRC instructions when one of these is installed
+try:
+    import crc32c
+    ALGORITHMS[CRC32C] = crc32c.crc32c
+except ImportError:
+    try:
+        import google_crc32c
+        ALGORITHMS[CRC32C] = google_crc32c.value
+    except ImportError:
+        pass
+
+# Most preferred first
+PREFERENCE = (CRC32C, CRC32)
+
+def supported_mask():
+    mask = 0
+    for algorithm in ALGORITHMS:
+        mask |= 1 << algorithm
+    return mask
+
+def choose(mask):
+    for algorithm in PREFERENCE:
+        if algorithm in ALGORITHMS and mask & (1 << algorithm):
+            return algorithm
+    return NONE
+
+def seal(message, algorithm):
+    if algorithm == NONE:
+        return message
+    return message + TRAILER.pack(ALGORITHMS[algorithm](message))
+
+def unseal(data, payload_len, algorithm):
+    # Returns the payload of a received datagram, raising ValueError if it was
+    # truncated (e.g. by the recvfrom buffer), padded, or corrupted.
+    trailer_len = TRAILER.size if algorithm != NONE else 0
+    expected = HEADER_SIZE + payload_len + trailer_len
+    if len(data) < expected:
+        raise ValueError(f"Truncated datagram: payload length {payload_len} needs {expected} bytes, received {len(data)}")
+    if len(data) > expected:
+        raise ValueError(f"Datagram length mismatch: payload length {payload_len} needs {expected} bytes, received {len(data)}")
+
+    end = HEADER_SIZE + payload_len
+    if trailer_len:
+        (received,) = TRAILER.unpack_from(data, end)
+        if received != ALGORITHMS[algorithm](data[:end]):
+            raise ValueError(f"Checksum mismatch ({NAMES[algorithm]})")
+    return data[HEADER_SIZE:end]
+
+def benchmark(sizes=(0, 64, 256, 512, 1000), number=100000):
+    # Cost per packet of sealing and verifying a datagram of each payload size
+    header = struct.pack('!HBBIIQI', 0xC461, 1, 1, 1, 0, 0, 0)
+    print(f"{'algorithm':<10}{'payload':>8}{'seal ns':>10}{'unseal ns':>12}")
+    for algorithm in (NONE,) + tuple(a for a in PREFERENCE if a in ALGORITHMS):
+        for size in sizes:
+            payload = b'x' * size
+            message = header + payload
+            sealed = seal(message, algorithm)
+            seal_time = timeit.timeit(lambda: seal(message, algorithm), number=number)
+            unseal_time = timeit.timeit(lambda: unseal(sealed, size, algorithm), number=number)
+            print(f"{NAMES[algorithm]:<10}{size:>8}{seal_time / number * 1e9:>10.0f}{unseal_time / number * 1e9:>12.0f}")
+
+if __name__ == '__main__':
+    benchmark(number=int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -5,6 +5,7 @@ import struct
 import time
 import threading
 import sys
+import checksum
 
 class State:
     HELLO_SEND = 0
@@ -28,12 +29,16 @@ class UAPClient:
         self.lock = threading.Lock()
         self.retries = 0
         self.max_retries = 3
+        self.last_payload = b''
+        self.checksum = checksum.NONE
         self.is_file_input = not sys.stdin.isatty()
 
     def generate_session_id(self):
         return struct.unpack("I", struct.pack("I", int(time.time())))[0]
 
     def send_message(self, command, payload=b''):
+        if command == 0:  # HELLO offers the checksum algorithms we support
+            payload = bytes([checksum.supported_mask()])
         header = struct.pack(
             '!HBBIIQI',
             self.magic_number,
@@ -45,6 +50,8 @@ class UAPClient:
             len(payload)
         )
         message = header + payload
+        if command != 0:
+            message = checksum.seal(message, self.checksum)
         self.socket.sendto(message, self.server_address)
         self.client_sequence_number += 1
         self.logical_clock += 1
@@ -58,8 +65,11 @@ class UAPClient:
             return None
 
     def handle_server_response(self, data):
-        header = data[:24]
-        payload = data[24:]
+        if len(data) < checksum.HEADER_SIZE:
+            print("Invalid packet received")
+            return
+
+        header = data[:checksum.HEADER_SIZE]
         (magic, version, command, sequence_number, session_id, logical_clock, payload_len) = struct.unpack(
             '!HBBIIQI', header
         )
@@ -68,12 +78,21 @@ class UAPClient:
             print("Invalid packet received")
             return
 
+        try:
+            payload = checksum.unseal(data, payload_len, self.checksum if command != 0 else checksum.NONE)
+        except ValueError as e:
+            print(f"Invalid packet received: {e}")
+            return
+
         self.logical_clock = max(self.logical_clock, logical_clock) + 1
         print(f"Updated logical clock: {self.logical_clock}")
 
         if command == 0:  # HELLO response
             if self.state == State.HELLO_WAIT:
                 print("Received HELLO response, session established")
+                if payload and payload[0] in checksum.ALGORITHMS:
+                    self.checksum = payload[0]
+                print(f"Checksum: {checksum.NAMES[self.checksum]}")
                 self.state = State.DATA_SEND
         elif command == 2:  # ALIVE response
             if self.state == State.ALIVE_WAIT:
@@ -106,106 +125,55 @@ class UAPClient:
                     self.state = State.CLOSED
                 else:
                     print("ALIVE response timeout, resending DATA.")
-                    self.send_message(1, b"Some data...")  # Resend DATA
+                    self.send_message(1, self.last_payload)  # Resend DATA
+
+    def next_line(self):
+        # Single input source for both modes; None means the session should end
+        if self.is_file_input:
+            line = sys.stdin.readline()
+            return line if line else None
+
+        try:
+            user_input = input("Enter data to send (or 'q' to quit): ")
+        except EOFError:
+            print("EOF detected on stdin, sending GOODBYE and closing session")
+            return None
+        if user_input.lower() == 'q':
+            print("Received 'q', sending GOODBYE and closing session")
+            return None
+        return user_input
 
     def start(self):
         print("Client started. Waiting for messages...")
 
-        if self.is_file_input:
-            # Handle input from file
-            while self.state != State.CLOSED:
-                if self.state == State.HELLO_SEND:
-                    print("Sending HELLO message to start session")
-                    self.send_message(0)  # Send HELLO
-                    self.state = State.HELLO_WAIT
+        while self.state != State.CLOSED:
+            if self.state == State.HELLO_SEND:
+                print("Sending HELLO message to start session")
+                self.send_message(0)  # Send HELLO
+                self.state = State.HELLO_WAIT
 
+            elif self.state in (State.HELLO_WAIT, State.ALIVE_WAIT):
+                data = self.receive_message()
+                if data:
+                    self.handle_server_response(data)
                 elif self.state == State.HELLO_WAIT:
-                    data = self.receive_message()
-                    if data:
-                        self.handle_server_response(data)
-                    else:
-                        self.hello_timeout()
-
-                elif self.state == State.DATA_SEND:
-                    # Read from stdin and send data
-                    for line in sys.stdin:
-                        if self.state == State.CLOSED:
-                            break
-                        self.send_message(1, line.encode())  # Send DATA message with file input
-                        self.state = State.ALIVE_WAIT
-
-                        # Wait for ALIVE response
-                        while self.state == State.ALIVE_WAIT:
-                            data = self.receive_message()
-                            if data:
-                                self.handle_server_response(data)
-                            else:
-                                self.alive_timeout()
-                    # After file input is complete
-                    if self.state != State.CLOSED:
-                        self.state = State.GOODBYE_SEND
-
-                elif self.state == State.ALIVE_WAIT:
-                    data = self.receive_message()
-                    if data:
-                        self.handle_server_response(data)
-                    else:
-                        self.alive_timeout()
-
-                elif self.state == State.GOODBYE_SEND:
-                    print("Sending GOODBYE to end session")
-                    self.send_message(3)  # Send GOODBYE
-                    self.state = State.CLOSED
-
-        else:
-            # Handle interactive user input
-            while self.state != State.CLOSED:
-                if self.state == State.HELLO_SEND:
-                    print("Sending HELLO message to start session")
-                    self.send_message(0)  # Send HELLO
-                    self.state = State.HELLO_WAIT
+                    self.hello_timeout()
+                else:
+                    self.alive_timeout()
 
-                elif self.state == State.HELLO_WAIT:
-                    data = self.receive_message()
-                    if data:
-                        self.handle_server_response(data)
-                    else:
-                        self.hello_timeout()
-
-                elif self.state == State.DATA_SEND:
-                    # Wait for user input from the console
-                    try:
-                        user_input = input("Enter data to send (or 'q' to quit): ")
-                        if user_input.lower() == 'q':
-                            print("Received 'q', sending GOODBYE and closing session")
-                            self.state = State.GOODBYE_SEND
-                        else:
-                            self.send_message(1, user_input.encode())  # Send DATA message with user input
-                            self.state = State.ALIVE_WAIT
-
-                            # Wait for ALIVE response
-                            while self.state == State.ALIVE_WAIT:
-                                data = self.receive_message()
-                                if data:
-                                    self.handle_server_response(data)
-                                else:
-                                    self.alive_timeout()
-
-                    except EOFError:
-                        print("EOF detected on stdin, sending GOODBYE and closing session")
-                        self.state = State.GOODBYE_SEND
-
-                elif self.state == State.ALIVE_WAIT:
-                    data = self.receive_message()
-                    if data:
-                        self.handle_server_response(data)
-                    else:
-                        self.alive_timeout()
-
-                elif self.state == State.GOODBYE_SEND:
-                    print("Sending GOODBYE to end session")
-                    self.send_message(3)  # Send GOODBYE
-                    self.state = State.CLOSED
+            elif self.state == State.DATA_SEND:
+                line = self.next_line()
+                if line is None:
+                    self.state = State.GOODBYE_SEND
+                else:
+                    self.last_payload = line.encode()
+                    self.send_message(1, self.last_payload)  # Send DATA message
+                    self.state = State.ALIVE_WAIT
+
+            elif self.state == State.GOODBYE_SEND:
+                print("Sending GOODBYE to end session")
+                self.send_message(3)  # Send GOODBYE
+                self.state = State.CLOSED
 
         print("Client session closed.")
 
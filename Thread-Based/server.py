@@ -4,6 +4,8 @@ import socket
 import threading
 import struct
 import sys
+import checksum
+import egress
 
 class UDPServerThread:
 
@@ -17,6 +19,7 @@ class UDPServerThread:
     def startServer(self):
         self.serverSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.serverSocket.bind(('localhost', self.portNumber))
+        self.egress = egress.EgressScheduler(self.serverSocket)
         print(f"Waiting on port {self.portNumber}...")
 
         try:
@@ -27,12 +30,13 @@ class UDPServerThread:
         except KeyboardInterrupt:
             print("Server interrupted by user. Shutting down...")
         finally:
+            self.egress.close()
             self.serverSocket.close()
             print("Server socket closed.")
 
     def handleClientPackets(self, data, clientAddress):
         try:
-            magic, version, command, sequenceNumber, sessionID, logicalClock, payloadLength = struct.unpack('!HBBIIQI', data[:24])
+            magic, version, command, sequenceNumber, sessionID, logicalClock, payloadLength = struct.unpack('!HBBIIQI', data[:checksum.HEADER_SIZE])
         except struct.error:
             print(f"Invalid packet format received from {clientAddress}, Ignored")
             return
@@ -43,6 +47,14 @@ class UDPServerThread:
         
         session = self.sessionStorage.get(sessionID)
 
+        # HELLO is never checksummed since it carries the negotiation itself
+        algorithm = session['checksum'] if session and command != 0 else checksum.NONE
+        try:
+            payload = checksum.unseal(data, payloadLength, algorithm)
+        except ValueError as e:
+            print(f"{e}: Invalid packet received from {clientAddress}, Ignored")
+            return
+
         if command == 0:  # HELLO
             if session and session['seq_num'] > 0:
                 print(f"Protocol Error: HELLO received during Receive State for Session ID: {sessionID}, Closing session.")
@@ -50,8 +62,10 @@ class UDPServerThread:
                 self.CloseSession(sessionID)
                 return 
 
-            session = self.CreateSession(sessionID, clientAddress)
-            self.SendHello(sessionID, clientAddress)
+            # A client that offers checksums sends a bitmask of supported algorithms
+            offered = payload[0] if payload else None
+            session = self.CreateSession(sessionID, clientAddress, checksum.choose(offered or 0))
+            self.SendHello(sessionID, clientAddress, offered is not None)
             return
         
         if not session:
@@ -59,7 +73,6 @@ class UDPServerThread:
             return
         
         if command == 1:  # DATA
-            payload = data[24:]
             self.handleClientData(sessionID, sequenceNumber, logicalClock, payload, clientAddress)
         
         elif command == 3:  # GOODBYE
@@ -92,10 +105,10 @@ class UDPServerThread:
         self.ResetTimer(sessionID)
         self.SendAlive(sessionID, clientAddress)
 
-    def CreateSession(self, sessionID, clientAddress):
-        session = {'seq_num': 0, 'address': clientAddress, 'logicalClock': 0}
+    def CreateSession(self, sessionID, clientAddress, algorithm=checksum.NONE):
+        session = {'seq_num': 0, 'address': clientAddress, 'logicalClock': 0, 'checksum': algorithm}
         self.sessionStorage[sessionID] = session
-        print(f"0x{sessionID:08x} [0] Session created")
+        print(f"0x{sessionID:08x} [0] Session created, checksum: {checksum.NAMES[algorithm]}")
         self.ResetTimer(sessionID)
         return session
     
@@ -120,26 +133,29 @@ class UDPServerThread:
             print(f"0x{sessionID:08x} Session closed")
             del self.sessionStorage[sessionID]
 
-    def SendHello(self, sessionID, clientAddress):
+    def SendHello(self, sessionID, clientAddress, negotiated=False):
         session = self.sessionStorage.get(sessionID)
         if session:
             session['logicalClock'] += 1
-            helloMessage = struct.pack('!HBBIIQI', self.magicNumber, self.versionNumber, 0, session['seq_num'], sessionID, session['logicalClock'], 0)
-            self.serverSocket.sendto(helloMessage, clientAddress)
+            payload = bytes([session['checksum']]) if negotiated else b''
+            helloMessage = struct.pack('!HBBIIQI', self.magicNumber, self.versionNumber, 0, session['seq_num'], sessionID, session['logicalClock'], len(payload)) + payload
+            self.egress.send(sessionID, helloMessage, clientAddress)
 
     def SendGoodbye(self, sessionID, clientAddress):
         session = self.sessionStorage.get(sessionID)
         if session:
             session['logicalClock'] += 1
             goodbyeMessage = struct.pack('!HBBIIQI', self.magicNumber, self.versionNumber, 3, session['seq_num'], sessionID, session['logicalClock'], 0)
-            self.serverSocket.sendto(goodbyeMessage, clientAddress)
+            goodbyeMessage = checksum.seal(goodbyeMessage, session['checksum'])
+            self.egress.send(sessionID, goodbyeMessage, clientAddress)
 
     def SendAlive(self, sessionID, clientAddress):
         session = self.sessionStorage.get(sessionID)
         if session:
             session['logicalClock'] += 1
             aliveMessage = struct.pack('!HBBIIQI', self.magicNumber, self.versionNumber, 2, session['seq_num'], sessionID, session['logicalClock'], 0)
-            self.serverSocket.sendto(aliveMessage, clientAddress)
+            aliveMessage = checksum.seal(aliveMessage, session['checksum'])
+            self.egress.send(sessionID, aliveMessage, clientAddress)
 
 if __name__ == "__main__":
     portNumber = int(sys.argv[1]) if len(sys.argv) > 1 else 12345